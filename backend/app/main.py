@@ -13,7 +13,7 @@ from pydantic import BaseModel
 from dotenv import load_dotenv
 
 from .services.openai_client import generate_script_and_scenes, extract_image_descriptions
-from .services.elevenlabs_client import synthesize_voiceover
+from .services.elevenlabs_client import synthesize_voiceover, synthesize_voiceover_sentences
 from .services.runway_client import generate_video_clips
 from .services.video_assembler import assemble_final_video
 
@@ -29,6 +29,7 @@ class StoryGenerationResponse(BaseModel):
     script: str
     scenes: List[Dict[str, Any]]
     video_url: Optional[str] = None
+    voiceover_timings: List[Dict[str, Any]] = []
     status: str
 
 app = FastAPI(title="Image-to-Video Story Generator", version="1.0")
@@ -46,6 +47,10 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 PUBLIC_DIR = os.path.join(BASE_DIR, "public")
 VIDEOS_DIR = os.path.join(PUBLIC_DIR, "videos")
 TEMP_DIR = os.path.join(BASE_DIR, "temp")
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR") or os.path.join(TEMP_DIR, "tts_cache")
+TTS_CACHE_MAX_MB = int(os.getenv("TTS_CACHE_MAX_MB") or 500)
+TTS_MAX_CONCURRENCY = int(os.getenv("TTS_MAX_CONCURRENCY") or 4)
+SPLIT_VOICEOVER = os.getenv("VOICEOVER_SPLIT_SENTENCES", "").lower() in ("1", "true", "yes")
 
 os.makedirs(VIDEOS_DIR, exist_ok=True)
 os.makedirs(TEMP_DIR, exist_ok=True)
@@ -114,7 +119,22 @@ async def generate_story(
         # 5. Generate voiceover
         elevenlabs_api_key = os.getenv("ELEVENLABS_API_KEY")
         voiceover_path = None
-        if elevenlabs_api_key:
+        voiceover_timings = []
+        if elevenlabs_api_key and SPLIT_VOICEOVER:
+            try:
+                voiceover_path, voiceover_timings = synthesize_voiceover_sentences(
+                    text=script,
+                    api_key=elevenlabs_api_key,
+                    voice_id="21m00Tcm4TlvDq8ikWAM",  # Rachel voice
+                    out_dir=story_dir,
+                    cache_dir=TTS_CACHE_DIR,
+                    max_workers=TTS_MAX_CONCURRENCY,
+                    cache_max_bytes=TTS_CACHE_MAX_MB * 1024 * 1024
+                )
+            except Exception as e:
+                # Sentences that did succeed stay cached for the next run
+                print(f"ElevenLabs sentence synthesis failed, falling back to one request: {e}")
+        if elevenlabs_api_key and voiceover_path is None:
             try:
                 voiceover_path = synthesize_voiceover(
                     text=script,
@@ -133,7 +153,8 @@ async def generate_story(
             clip_paths=clip_paths,
             voiceover_path=voiceover_path,
             script=script,
-            output_path=output_path
+            output_path=output_path,
+            caption_timings=voiceover_timings
         )
         
         video_url = f"/public/videos/{output_filename}"
@@ -143,6 +164,7 @@ async def generate_story(
             script=script,
             scenes=scenes,
             video_url=video_url,
+            voiceover_timings=voiceover_timings,
             status="completed"
         )
         
@@ -1,32 +1,346 @@
 from __future__ import annotations
 
+import hashlib
+import json
 import os
+import re
+import time
 import uuid
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
 import requests
 
+DEFAULT_MODEL_ID = "eleven_monolingual_v1"
+DEFAULT_VOICE_SETTINGS = {"stability": 0.5, "similarity_boost": 0.7}
 
-def synthesize_voiceover(text: str, api_key: str, voice_id: str, out_dir: str) -> str:
-    """Synthesize voiceover with ElevenLabs. Returns MP3 file path.
+# Sentence segments are fetched as raw 16-bit mono PCM so their lengths are
+# exact sample counts and joining them needs no decode/re-encode
+PCM_SAMPLE_RATE = 24000
+PCM_FORMAT = f"pcm_{PCM_SAMPLE_RATE}"
 
-    Raises on error. Caller may catch and fallback.
+MAX_RETRIES = 4
+RETRY_BACKOFF = 1.0
+_RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Partial segment writes older than this were left by an interrupted run
+STALE_TMP_SECONDS = 600
+
+_SENTENCE = re.compile(r"\S.*?(?:[.!?]+[\"')\]”’]*(?=\s|$)|$)", re.DOTALL)
+# A fragment ending in a title, a Latin abbreviation, a.m./p.m. or an initial
+# (including dotted ones like "U.S.") is not a sentence end; splitting there gives choppy, wrongly intoned narration
+_ABBREVIATION = re.compile(
+    r"(?:^|[\s(\"'“‘.])(?:(?i:mr|mrs|ms|dr|prof|st|jr|sr|vs|mt|e\.g|i\.e|a\.m|p\.m)|[A-Z])\.$"
+)
+
+
+def _request_speech(
+    text: str,
+    api_key: str,
+    voice_id: str,
+    model_id: str,
+    voice_settings: Dict[str, Any],
+    timeout: int,
+    retries: int = 0,
+    output_format: Optional[str] = None,
+    previous_text: Optional[str] = None,
+    next_text: Optional[str] = None,
+    session: Optional[requests.Session] = None,
+) -> bytes:
+    """POST a text-to-speech request, retrying rate limits and server errors.
+
+    Backs off exponentially between attempts, honouring ``Retry-After``
+    when ElevenLabs sends one. Pass a ``session`` to reuse connections.
     """
-    os.makedirs(out_dir, exist_ok=True)
+    post = session.post if session is not None else requests.post
     url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
     headers = {
-        "accept": "audio/mpeg",
+        "accept": "audio/mpeg" if output_format is None else "*/*",
         "xi-api-key": api_key,
         "content-type": "application/json",
     }
+    params = {"output_format": output_format} if output_format else None
     payload = {
         "text": text,
-        "model_id": "eleven_monolingual_v1",
-        "voice_settings": {"stability": 0.5, "similarity_boost": 0.7},
+        "model_id": model_id,
+        "voice_settings": voice_settings,
     }
-    r = requests.post(url, headers=headers, json=payload, timeout=60)
-    r.raise_for_status()
+    if previous_text:
+        payload["previous_text"] = previous_text
+    if next_text:
+        payload["next_text"] = next_text
+    attempt = 0
+    while True:
+        delay = RETRY_BACKOFF * 2 ** attempt
+        try:
+            r = post(url, headers=headers, params=params, json=payload, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt >= retries:
+                raise
+        else:
+            if r.status_code not in _RETRY_STATUS or attempt >= retries:
+                r.raise_for_status()
+                return r.content
+            retry_after = r.headers.get("retry-after", "")
+            if retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+        time.sleep(delay)
+        attempt += 1
+
+
+def synthesize_voiceover(
+    text: str,
+    api_key: str,
+    voice_id: str,
+    out_dir: str,
+    model_id: str = DEFAULT_MODEL_ID,
+    voice_settings: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Synthesize voiceover with ElevenLabs. Returns MP3 file path.
+
+    Raises on error. Caller may catch and fallback.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    audio = _request_speech(
+        text,
+        api_key,
+        voice_id,
+        model_id,
+        voice_settings or DEFAULT_VOICE_SETTINGS,
+        timeout=60,
+    )
     out_path = os.path.join(out_dir, f"vo-{uuid.uuid4().hex[:8]}.mp3")
     with open(out_path, "wb") as f:
-        f.write(r.content)
+        f.write(audio)
     return out_path
 
 
+def split_sentences(text: str) -> List[str]:
+    """Split a script into sentences on terminal punctuation.
+
+    Abbreviations such as "Dr.", "e.g." or "a.m." and initials such as
+    "J." or "U.S." don't end a sentence.
+    """
+    sentences: List[str] = []
+    carry = ""
+    for match in _SENTENCE.finditer(text):
+        fragment = f"{carry} {match.group(0).strip()}" if carry else match.group(0).strip()
+        if _ABBREVIATION.search(fragment):
+            carry = fragment
+        else:
+            sentences.append(fragment)
+            carry = ""
+    if carry:
+        sentences.append(carry)
+    return sentences
+
+
+def _cache_key(text: str, voice_id: str, model_id: str, voice_settings: Dict[str, Any]) -> str:
+    blob = json.dumps(
+        {
+            "text": text,
+            "voice_id": voice_id,
+            "model_id": model_id,
+            "voice_settings": voice_settings,
+            "output_format": PCM_FORMAT,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def _synthesize_cached(
+    sentence: str,
+    api_key: str,
+    voice_id: str,
+    model_id: str,
+    voice_settings: Dict[str, Any],
+    cache_dir: str,
+    previous_text: Optional[str] = None,
+    next_text: Optional[str] = None,
+    session: Optional[requests.Session] = None,
+) -> str:
+    path = os.path.join(cache_dir, f"{_cache_key(sentence, voice_id, model_id, voice_settings)}.wav")
+    try:
+        # Refresh the mtime so pruning evicts least recently used segments
+        os.utime(path)
+        return path
+    except FileNotFoundError:
+        # Not cached, or pruned by another worker since; fetch it again
+        pass
+
+    pcm = _request_speech(
+        sentence,
+        api_key,
+        voice_id,
+        model_id,
+        voice_settings,
+        timeout=30,
+        retries=MAX_RETRIES,
+        output_format=PCM_FORMAT,
+        previous_text=previous_text,
+        next_text=next_text,
+        session=session,
+    )
+    # Write to a temp name first so a concurrent or interrupted run never
+    # sees a partial file under the cache key
+    tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with wave.open(tmp_path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(PCM_SAMPLE_RATE)
+        w.writeframes(pcm)
+    os.replace(tmp_path, path)
+    return path
+
+
+def prune_tts_cache(cache_dir: str, max_bytes: int):
+    """Delete least recently used segments until the cache fits in ``max_bytes``.
+
+    Also removes ``.tmp`` files left behind by interrupted runs. Other
+    workers may prune the same directory concurrently, so files that
+    disappear underneath are skipped.
+    """
+    stale_before = time.time() - STALE_TMP_SECONDS
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith((".wav", ".tmp")):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)
+            if name.endswith(".tmp"):
+                if stat.st_mtime < stale_before:
+                    os.remove(path)
+                continue
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def _concat_wav(paths: List[str], out_path: str) -> List[int]:
+    """Join WAV segments sample-for-sample. Returns each segment's frame count."""
+    frame_counts = []
+    with wave.open(out_path, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(PCM_SAMPLE_RATE)
+        for path in paths:
+            with wave.open(path, "rb") as segment:
+                frames = segment.readframes(segment.getnframes())
+            out.writeframes(frames)
+            frame_counts.append(len(frames) // 2)
+    return frame_counts
+
+
+def _sentence_timings(
+    sentences: List[str], frame_counts: List[int], sample_rate: int = PCM_SAMPLE_RATE
+) -> List[Dict[str, Any]]:
+    """Lay sentences end to end, counting in samples so rounding never accumulates."""
+    timings = []
+    cursor = 0
+    for sentence, frames in zip(sentences, frame_counts):
+        timings.append(
+            {
+                "text": sentence,
+                "start": round(cursor / sample_rate, 3),
+                "end": round((cursor + frames) / sample_rate, 3),
+            }
+        )
+        cursor += frames
+    return timings
+
+
+def synthesize_voiceover_sentences(
+    text: str,
+    api_key: str,
+    voice_id: str,
+    out_dir: str,
+    cache_dir: str,
+    model_id: str = DEFAULT_MODEL_ID,
+    voice_settings: Optional[Dict[str, Any]] = None,
+    max_workers: int = 4,
+    cache_max_bytes: Optional[int] = None,
+) -> Tuple[str, List[Dict[str, Any]]]:
+    """Synthesize voiceover sentence by sentence with ElevenLabs.
+
+    Sentences are requested concurrently (at most ``max_workers`` at a
+    time, to stay within the plan's concurrency limit), each retried on
+    rate limits and server errors, and cached in ``cache_dir`` by
+    (text, voice_id, model_id, voice_settings), so regenerations only pay
+    for sentences that changed. Returns the joined WAV path and a list of
+    ``{"text", "start", "end"}`` timings in seconds for each sentence.
+    If ``cache_max_bytes`` is set, the cache is pruned back under it
+    afterwards.
+
+    Raises on error. Caller may catch and fallback.
+    """
+    sentences = split_sentences(text)
+    if not sentences:
+        raise ValueError("No text to synthesize")
+
+    settings = voice_settings or DEFAULT_VOICE_SETTINGS
+    os.makedirs(out_dir, exist_ok=True)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # Repeated sentences are only requested once. Neighbouring sentences are
+    # sent as context so intonation carries across the cuts; they are left
+    # out of the cache key so editing one sentence doesn't invalidate the
+    # ones around it.
+    context: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+    for i, sentence in enumerate(sentences):
+        context.setdefault(
+            sentence,
+            (
+                sentences[i - 1] if i > 0 else None,
+                sentences[i + 1] if i + 1 < len(sentences) else None,
+            ),
+        )
+
+    unique = list(context)
+    workers = max(1, min(max_workers, len(unique)))
+
+    # One pooled session so sentences reuse connections instead of each
+    # paying a fresh TCP/TLS handshake
+    with requests.Session() as session:
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        session.mount("https://", adapter)
+
+        def synthesize(sentence: str) -> str:
+            previous_text, next_text = context[sentence]
+            return _synthesize_cached(
+                sentence,
+                api_key,
+                voice_id,
+                model_id,
+                settings,
+                cache_dir,
+                previous_text,
+                next_text,
+                session,
+            )
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            segment_paths = dict(zip(unique, pool.map(synthesize, unique)))
+
+    paths = [segment_paths[s] for s in sentences]
+    out_path = os.path.join(out_dir, f"vo-{uuid.uuid4().hex[:8]}.wav")
+    frame_counts = _concat_wav(paths, out_path)
+    if cache_max_bytes is not None:
+        # The voiceover is already joined; housekeeping must not fail it
+        try:
+            prune_tts_cache(cache_dir, cache_max_bytes)
+        except OSError as e:
+            print(f"TTS cache pruning failed: {e}")
+    return out_path, _sentence_timings(sentences, frame_counts)
@@ -1,12 +1,41 @@
 import os
 import subprocess
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
+
+CAPTION_STYLE = "fontsize=40:fontcolor=white:box=1:boxcolor=black@0.5:x=(w-text_w)/2:y=h-th-20"
+
+def escape_drawtext(text: str) -> str:
+    """Escape caption text for a drawtext option inside a filtergraph.
+
+    Text expansion is disabled on the filter (expansion=none), so ``%`` is
+    literal. What remains are the two parsing levels ffmpeg applies: the
+    filter option parser (``\\``, ``'`` and ``:``) and then the filtergraph
+    parser (``\\``, ``'``, ``[``, ``]``, ``,`` and ``;``).
+    """
+    option_level = text.replace("\\", "\\\\").replace("'", "\\'").replace(":", "\\:")
+    return "".join("\\" + c if c in "\\'[],;" else c for c in option_level)
+
+def build_caption_filter(script: str, caption_timings: Optional[List[Dict[str, Any]]] = None) -> str:
+    """Build the drawtext filter, showing each sentence only while it is spoken if timings are given"""
+    if not caption_timings:
+        return f"drawtext=text={escape_drawtext(script)}:expansion=none:{CAPTION_STYLE}"
+
+    filters = []
+    for timing in caption_timings:
+        # Half-open interval: a sentence's end is the next one's start, and
+        # between() would draw both captions on a frame landing exactly on it
+        filters.append(
+            f"drawtext=text={escape_drawtext(timing['text'])}:expansion=none:{CAPTION_STYLE}"
+            f":enable='gte(t,{timing['start']})*lt(t,{timing['end']})'"
+        )
+    return ",".join(filters)
 
 def assemble_final_video(
     clip_paths: List[str],
     voiceover_path: Optional[str],
     script: str,
-    output_path: str
+    output_path: str,
+    caption_timings: Optional[List[Dict[str, Any]]] = None
 ):
     """Assemble the final video by concatenating clips, adding voiceover and captions"""
     
@@ -33,19 +62,19 @@ def assemble_final_video(
         subprocess.run(concat_cmd, check=True, capture_output=True)
         
         # Step 2: Add voiceover and captions
+        caption_filter = build_caption_filter(script, caption_timings)
         if voiceover_path and os.path.exists(voiceover_path):
             # Add voiceover and captions
             final_cmd = [
                 "ffmpeg", "-i", concatenated_path, "-i", voiceover_path,
-                "-filter_complex", 
-                f"drawtext=text='{script}':fontsize=40:fontcolor=white:box=1:boxcolor=black@0.5:x=(w-text_w)/2:y=h-th-20",
+                "-filter_complex", caption_filter,
                 "-c:v", "libx264", "-c:a", "aac", "-shortest", output_path
             ]
         else:
             # Add only captions
             final_cmd = [
                 "ffmpeg", "-i", concatenated_path,
-                "-vf", f"drawtext=text='{script}':fontsize=40:fontcolor=white:box=1:boxcolor=black@0.5:x=(w-text_w)/2:y=h-th-20",
+                "-vf", caption_filter,
                 "-c:v", "libx264", "-c:a", "aac", output_path
             ]
         
@@ -75,7 +104,7 @@ def create_fallback_video(clip_paths: List[str], script: str, output_path: str):
         cmd = [
             "ffmpeg", "-f", "lavfi", 
             "-i", "color=c=black:size=1920x1080:duration=10",
-            "-vf", f"drawtext=text='{script_text}':fontsize=60:fontcolor=white:x=(w-text_w)/2:y=(h-text_h)/2",
+            "-vf", f"drawtext=text={escape_drawtext(script_text)}:expansion=none:fontsize=60:fontcolor=white:x=(w-text_w)/2:y=(h-text_h)/2",
             "-c:v", "libx264", "-c:a", "aac", output_path
         ]
         
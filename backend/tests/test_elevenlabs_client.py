@@ -0,0 +1,200 @@
+import wave
+
+import pytest
+import requests
+
+from app.services import elevenlabs_client
+from app.services.elevenlabs_client import (
+    PCM_SAMPLE_RATE,
+    _cache_key,
+    _sentence_timings,
+    prune_tts_cache,
+    split_sentences,
+    synthesize_voiceover_sentences,
+)
+
+SETTINGS = {"stability": 0.5, "similarity_boost": 0.7}
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("Hello there. How are you?", ["Hello there.", "How are you?"]),
+        ('"Is it you?" she asked!  Yes...', ['"Is it you?"', "she asked!", "Yes..."]),
+        ("One.\nTwo (really).", ["One.", "Two (really)."]),
+        ("Mix. “Quoted.” Next.", ["Mix.", "“Quoted.”", "Next."]),
+        ("She said ‘go.’ We went.", ["She said ‘go.’", "We went."]),
+        ("No punctuation at all", ["No punctuation at all"]),
+        ("v1.5 is out. Great", ["v1.5 is out.", "Great"]),
+        ("It was Dr. Smith! Then he left.", ["It was Dr. Smith!", "Then he left."]),
+        ("Use tools, e.g. this one. Ok.", ["Use tools, e.g. this one.", "Ok."]),
+        ("J. R. R. Tolkien wrote it.", ["J. R. R. Tolkien wrote it."]),
+        ("Is it? No. It is not.", ["Is it?", "No.", "It is not."]),
+        ("The U.S. Army arrived.", ["The U.S. Army arrived."]),
+        ("Back to the U.K. soon. Bye.", ["Back to the U.K. soon.", "Bye."]),
+        ("From 9 a.m. to 5 p.m. daily. Closed Sundays.", ["From 9 a.m. to 5 p.m. daily.", "Closed Sundays."]),
+        ("   ", []),
+    ],
+)
+def test_split_sentences(text, expected):
+    assert split_sentences(text) == expected
+
+
+def test_cache_key_depends_on_every_field():
+    base = _cache_key("Hello.", "voice", "model", SETTINGS)
+    assert _cache_key("Hello.", "voice", "model", dict(SETTINGS)) == base
+    assert _cache_key("Hello!", "voice", "model", SETTINGS) != base
+    assert _cache_key("Hello.", "other", "model", SETTINGS) != base
+    assert _cache_key("Hello.", "voice", "other", SETTINGS) != base
+    assert _cache_key("Hello.", "voice", "model", {**SETTINGS, "stability": 0.6}) != base
+
+
+def test_sentence_timings_are_contiguous():
+    timings = _sentence_timings(["a", "b", "c"], [24000, 12000, 36000], 24000)
+    assert timings == [
+        {"text": "a", "start": 0.0, "end": 1.0},
+        {"text": "b", "start": 1.0, "end": 1.5},
+        {"text": "c", "start": 1.5, "end": 3.0},
+    ]
+
+
+def test_sentence_timings_do_not_accumulate_rounding():
+    # 1/3 s per segment would drift if each duration were rounded before summing
+    timings = _sentence_timings(["x"] * 300, [8000] * 300, 24000)
+    assert timings[-1]["end"] == 100.0
+
+
+@pytest.fixture
+def fake_speech(monkeypatch):
+    calls = []
+
+    def request_speech(text, *args, **kwargs):
+        assert isinstance(kwargs.get("session"), requests.Session)
+        calls.append((text, kwargs.get("previous_text"), kwargs.get("next_text")))
+        return b"\x01\x00" * (len(text) * 100)
+
+    monkeypatch.setattr(elevenlabs_client, "_request_speech", request_speech)
+    return calls
+
+
+def test_repeated_and_cached_sentences_are_requested_once(tmp_path, fake_speech):
+    cache_dir = str(tmp_path / "cache")
+    text = "Hi there. Bye now! Hi there."
+
+    out_path, timings = synthesize_voiceover_sentences(
+        text, "key", "voice", str(tmp_path), cache_dir
+    )
+    assert sorted(call[0] for call in fake_speech) == ["Bye now!", "Hi there."]
+    assert [t["text"] for t in timings] == ["Hi there.", "Bye now!", "Hi there."]
+
+    with wave.open(out_path, "rb") as w:
+        assert w.getframerate() == PCM_SAMPLE_RATE
+        assert timings[-1]["end"] == round(w.getnframes() / PCM_SAMPLE_RATE, 3)
+
+    synthesize_voiceover_sentences(
+        text + " Something new.", "key", "voice", str(tmp_path), cache_dir
+    )
+    assert len(fake_speech) == 3
+    assert fake_speech[-1] == ("Something new.", "Hi there.", None)
+
+
+def test_prune_tts_cache_evicts_least_recently_used(tmp_path):
+    for i, name in enumerate(["old", "mid", "new"]):
+        path = tmp_path / f"{name}.wav"
+        path.write_bytes(b"\x00" * 100)
+        elevenlabs_client.os.utime(path, (i, i))
+
+    prune_tts_cache(str(tmp_path), 200)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["mid.wav", "new.wav"]
+
+
+def test_prune_tts_cache_removes_stale_partial_writes(tmp_path):
+    stale = tmp_path / "abc.wav.1234.tmp"
+    fresh = tmp_path / "def.wav.5678.tmp"
+    stale.write_bytes(b"\x00")
+    fresh.write_bytes(b"\x00")
+    old = elevenlabs_client.time.time() - elevenlabs_client.STALE_TMP_SECONDS - 1
+    elevenlabs_client.os.utime(stale, (old, old))
+
+    prune_tts_cache(str(tmp_path), 10**9)
+    assert [p.name for p in tmp_path.iterdir()] == ["def.wav.5678.tmp"]
+
+
+def test_prune_tts_cache_skips_files_removed_concurrently(tmp_path, monkeypatch):
+    for name in ["a", "b"]:
+        (tmp_path / f"{name}.wav").write_bytes(b"\x00" * 100)
+    real_stat = elevenlabs_client.os.stat
+
+    def stat(path, *args, **kwargs):
+        if path.endswith("a.wav"):
+            raise FileNotFoundError(path)
+        return real_stat(path, *args, **kwargs)
+
+    monkeypatch.setattr(elevenlabs_client.os, "stat", stat)
+    prune_tts_cache(str(tmp_path), 0)
+    assert [p.name for p in tmp_path.iterdir()] == ["a.wav"]
+
+
+def test_pruning_failure_does_not_fail_synthesis(tmp_path, fake_speech, monkeypatch):
+    def prune(*args):
+        raise FileNotFoundError("gone")
+
+    monkeypatch.setattr(elevenlabs_client, "prune_tts_cache", prune)
+    out_path, timings = synthesize_voiceover_sentences(
+        "Hello.", "key", "voice", str(tmp_path), str(tmp_path / "cache"), cache_max_bytes=0
+    )
+    assert [t["text"] for t in timings] == ["Hello."]
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.content = b"audio"
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(str(self.status_code))
+
+
+def test_request_speech_retries_rate_limits(monkeypatch):
+    responses = [FakeResponse(429, {"retry-after": "2"}), FakeResponse(503), FakeResponse(200)]
+    sleeps = []
+    monkeypatch.setattr(elevenlabs_client.requests, "post", lambda *a, **k: responses.pop(0))
+    monkeypatch.setattr(elevenlabs_client.time, "sleep", sleeps.append)
+
+    audio = elevenlabs_client._request_speech("Hi.", "key", "voice", "model", SETTINGS, 30, retries=3)
+    assert audio == b"audio"
+    assert sleeps == [2.0, 2.0]
+
+
+def test_request_speech_uses_given_session(monkeypatch):
+    session = requests.Session()
+    monkeypatch.setattr(session, "post", lambda *a, **k: FakeResponse(200))
+    monkeypatch.setattr(elevenlabs_client.requests, "post", lambda *a, **k: FakeResponse(500))
+
+    audio = elevenlabs_client._request_speech(
+        "Hi.", "key", "voice", "model", SETTINGS, 30, session=session
+    )
+    assert audio == b"audio"
+
+
+def test_request_speech_gives_up_after_retries(monkeypatch):
+    monkeypatch.setattr(elevenlabs_client.requests, "post", lambda *a, **k: FakeResponse(429))
+    monkeypatch.setattr(elevenlabs_client.time, "sleep", lambda _: None)
+
+    with pytest.raises(requests.HTTPError):
+        elevenlabs_client._request_speech("Hi.", "key", "voice", "model", SETTINGS, 30, retries=2)
+
+
+def test_request_speech_does_not_retry_client_errors(monkeypatch):
+    calls = []
+
+    def post(*args, **kwargs):
+        calls.append(1)
+        return FakeResponse(401)
+
+    monkeypatch.setattr(elevenlabs_client.requests, "post", post)
+    with pytest.raises(requests.HTTPError):
+        elevenlabs_client._request_speech("Hi.", "key", "voice", "model", SETTINGS, 30, retries=3)
+    assert len(calls) == 1
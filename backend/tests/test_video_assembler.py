@@ -0,0 +1,58 @@
+import re
+
+from app.services.video_assembler import build_caption_filter, escape_drawtext
+
+
+def test_escape_drawtext_matches_ffmpeg_docs_example():
+    text = "this is a 'string': may contain one, or more, special characters"
+    assert escape_drawtext(text) == (
+        "this is a \\\\\\'string\\\\\\'\\\\: may contain one\\, or more\\, special characters"
+    )
+
+
+def test_escape_drawtext_special_characters():
+    assert escape_drawtext("Chapter 1: 50%") == "Chapter 1\\\\: 50%"
+    assert escape_drawtext("a\\b") == "a\\\\\\\\b"
+    assert escape_drawtext("[x];") == "\\[x\\]\\;"
+
+
+def test_build_caption_filter_without_timings():
+    assert build_caption_filter("Hi: there").startswith(
+        "drawtext=text=Hi\\\\: there:expansion=none:"
+    )
+
+
+def test_build_caption_filter_with_timings():
+    caption_filter = build_caption_filter(
+        "ignored",
+        [
+            {"text": "It's 50%.", "start": 0.0, "end": 1.2},
+            {"text": "Next, go.", "start": 1.2, "end": 2.5},
+        ],
+    )
+    first, second = caption_filter.split(",drawtext=")
+    assert first.startswith("drawtext=text=It\\\\\\'s 50%.:expansion=none:")
+    assert first.endswith(":enable='gte(t,0.0)*lt(t,1.2)'")
+    assert second.startswith("text=Next\\, go.:expansion=none:")
+    assert second.endswith(":enable='gte(t,1.2)*lt(t,2.5)'")
+
+
+def test_adjacent_captions_never_overlap():
+    timings = [
+        {"text": "One.", "start": 0.0, "end": 1.2},
+        {"text": "Two.", "start": 1.2, "end": 2.48},
+        {"text": "Three.", "start": 2.48, "end": 4.0},
+    ]
+    intervals = [
+        (float(start), float(end))
+        for start, end in re.findall(
+            r"enable='gte\(t,([\d.]+)\)\*lt\(t,([\d.]+)\)'", build_caption_filter("", timings)
+        )
+    ]
+    assert len(intervals) == len(timings)
+
+    # Every 25 fps frame, including those landing exactly on a boundary,
+    # shows exactly one caption
+    for frame in range(100):
+        t = frame / 25
+        assert sum(start <= t < end for start, end in intervals) == 1